@@ -2,18 +2,38 @@
 """Minimal ROCON Docs API - No external dependencies"""
 
 from http.server import BaseHTTPRequestHandler
-import json
+
+# orjson is a faster drop-in when the runtime has it; stdlib json otherwise
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    _loads = json.loads
 
 
 class handler(BaseHTTPRequestHandler):
-    
-    def do_GET(self):
-        """Health check - returns JSON"""
-        self.send_response(200)
+
+    def _send_json(self, status: int, payload):
+        """Serialize payload and send it with JSON + CORS headers"""
+        body = _dumps(payload)
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """Health check - returns JSON"""
         response = {
             "status": "healthy",
             "message": "ROCON Docs Assistant API",
@@ -23,18 +43,18 @@ class handler(BaseHTTPRequestHandler):
                 "POST /": "Ask a question (coming soon)"
             }
         }
-        
-        self.wfile.write(json.dumps(response, indent=2).encode())
-    
+
+        self._send_json(200, response)
+
     def do_POST(self):
         """Simple echo endpoint"""
         try:
             content_length = int(self.headers.get('Content-Length', 0))
             body = self.rfile.read(content_length)
-            data = json.loads(body.decode('utf-8'))
-            
+            data = _loads(body)
+
             question = data.get('question', 'No question provided')
-            
+
             response = {
                 "answer": f"✅ API is working! You asked: '{question}'\n\nFull RAG system integration coming soon.",
                 "sources": [],
@@ -43,31 +63,22 @@ class handler(BaseHTTPRequestHandler):
                     "received_question": question
                 }
             }
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            self.wfile.write(json.dumps(response, indent=2).encode())
-        
-    except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
+
+            self._send_json(200, response)
+
+        except Exception as e:
             error = {
                 "error": str(e),
                 "type": type(e).__name__,
                 "message": "Error processing request"
             }
-            self.wfile.write(json.dumps(error).encode())
-    
+            self._send_json(500, error)
+
     def do_OPTIONS(self):
         """CORS preflight"""
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
@@ -0,0 +1,84 @@
+"""Persistent embedding cache keyed by content hash, so unchanged chunks are never re-embedded."""
+
+import hashlib
+import os
+import sqlite3
+from typing import Callable, List
+
+import numpy as np
+
+from .config import BASE_DIR
+
+CACHE_PATH = BASE_DIR / "vectorstore" / "embed_cache.sqlite"
+
+# Keys per SELECT ... IN (...) query, below SQLite's bound-parameter limit
+_LOOKUP_BATCH = 500
+# Missing texts per embed_fn call. Each window is committed before the next
+# starts; 16384 is about one round of concurrent build requests
+# (LLM_MAX_ASYNC x EMBED_BATCH_SIZE), so windows don't cost parallelism
+_EMBED_WINDOW = 16384
+
+
+def cache_key(text: str, model: str) -> bytes:
+    """SHA-256 of model + text; a model (or dimension) change misses the cache."""
+    return hashlib.sha256(f"{model}|{text}".encode("utf-8")).digest()
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(str(CACHE_PATH)), exist_ok=True)
+    conn = sqlite3.connect(str(CACHE_PATH))
+    conn.execute("CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+    return conn
+
+
+def get_or_compute(
+    texts: List[str],
+    model: str,
+    embed_fn: Callable[[List[str]], np.ndarray]
+) -> np.ndarray:
+    """
+    Return an (N, dim) float32 matrix of embeddings for texts, in order.
+
+    Cached vectors are read from CACHE_PATH; only the misses are passed to
+    embed_fn (which must return one float32 row per input text), up to
+    _EMBED_WINDOW at a time, and each window's vectors are stored for the
+    next build as soon as it is embedded.
+    """
+    keys = [cache_key(t, model) for t in texts]
+    found = {}
+
+    conn = _connect()
+    try:
+        unique_keys = list(dict.fromkeys(keys))
+        for i in range(0, len(unique_keys), _LOOKUP_BATCH):
+            batch = unique_keys[i:i + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, vec FROM cache WHERE key IN ({placeholders})", batch
+            )
+            for key, vec in rows:
+                found[key] = np.frombuffer(vec, dtype=np.float32)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        print(f"🗃️  Embedding cache: {len(found)} hits, {len(missing)} misses")
+
+        # Commit each window as soon as it is embedded, so a failed request
+        # only loses the window it was part of
+        missing_keys = list(missing)
+        for i in range(0, len(missing_keys), _EMBED_WINDOW):
+            window = missing_keys[i:i + _EMBED_WINDOW]
+            vectors = np.asarray(embed_fn([missing[key] for key in window]), dtype=np.float32)
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO cache (key, vec) VALUES (?, ?)",
+                    [(key, vec.tobytes()) for key, vec in zip(window, vectors)]
+                )
+            found.update(zip(window, vectors))
+    finally:
+        conn.close()
+
+    return np.stack([found[key] for key in keys])
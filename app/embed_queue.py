@@ -0,0 +1,122 @@
+"""Micro-batching of concurrent requests (query embeddings, index searches) and per-event-loop state."""
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+# A batch is sent once it holds MAX_BATCH items or MAX_WAIT seconds after its
+# first item arrived, whichever comes first
+MAX_BATCH = 64
+MAX_WAIT = 0.010
+
+_LOOP_LOCAL_LOCK = threading.Lock()
+# Pending _close_at_shutdown tasks (the loop only keeps weak references)
+_CLOSERS = set()
+
+
+def loop_local(
+    registry: weakref.WeakKeyDictionary,
+    factory: Callable[[], Any],
+    close: Optional[Callable[[Any], Awaitable[Any]]] = None
+) -> Any:
+    """
+    registry's value for the running event loop, created by factory() on first use.
+
+    asyncio objects can't be shared across loops, so each thread or
+    asyncio.run() gets its own. If close is given, close(value) is awaited when
+    the loop shuts down (asyncio.run() cancels pending tasks before closing).
+    Entries of closed loops are dropped when a new one is added: values such
+    as worker tasks reference their loop, so the weak key alone never
+    releases them.
+    """
+    loop = asyncio.get_running_loop()
+    value = registry.get(loop)
+    if value is None:
+        with _LOOP_LOCAL_LOCK:
+            value = registry.get(loop)
+            if value is None:
+                for old in [l for l in list(registry) if l.is_closed()]:
+                    registry.pop(old, None)
+                value = registry[loop] = factory()
+                if close is not None:
+                    task = loop.create_task(_close_at_shutdown(value, close))
+                    _CLOSERS.add(task)
+                    task.add_done_callback(_CLOSERS.discard)
+    return value
+
+
+async def _close_at_shutdown(value: Any, close: Callable[[Any], Awaitable[Any]]):
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await close(value)
+
+
+class BatchQueue:
+    """
+    Coalesces items submitted within a short window into one batch_fn call.
+
+    batch_fn receives up to MAX_BATCH items (e.g. query texts to embed) and
+    must return one result per item, in order. Each event loop that calls
+    submit() gets its own queue and worker task (see loop_local), so threads
+    running their own loops never share a batch.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[Any]],
+        max_batch: int = MAX_BATCH,
+        max_wait: float = MAX_WAIT
+    ):
+        self._batch_fn = batch_fn
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        # Per event loop: (queue, worker task). The worker runs until its loop
+        # shuts down; holding it here keeps it from being garbage collected
+        self._workers = weakref.WeakKeyDictionary()
+        # Strong references to in-flight dispatch tasks (the loop only keeps weak ones)
+        self._inflight = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Result for item, computed together with other pending items."""
+        queue, _ = loop_local(self._workers, self._start_worker)
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((item, future))
+        return await future
+
+    def _start_worker(self) -> Tuple[asyncio.Queue, asyncio.Task]:
+        queue = asyncio.Queue()
+        return queue, asyncio.get_running_loop().create_task(self._run(queue))
+
+    async def _run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Send without waiting, so the next batch collects while this one is
+            # in flight; batch_fn is responsible for bounding its own concurrency
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self._batch_fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
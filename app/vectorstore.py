@@ -1,37 +1,286 @@
-import json
+import asyncio
+import base64
+import bisect
+import mmap
 import os
-import pickle
+import random
+import shutil
+import threading
+import time
+import weakref
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import BinaryIO, Callable, List, Dict, Tuple, Optional
 
 import faiss
+import msgpack
 import numpy as np
+import orjson
 import requests
-from openai import OpenAI
-from collections import defaultdict
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, OpenAI, RateLimitError
+from collections import Counter, OrderedDict, defaultdict
 
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to UTF-8 byte lengths (an upper bound)
+    tiktoken = None
+
+from . import embed_cache, embed_queue
 from .config import OPENAI_API_KEY, EMBED_MODEL, BASE_DIR
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# SDK retries are disabled: create_embeddings*() are the only retry layer
+# (LLM_MAX_RETRIES), and don't hold a concurrency slot while backing off.
+# The async client's connection pool is bound to the loop that opened it, so
+# there is one per event loop, closed when that loop shuts down (see _async_client)
+client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+
+# Shared HTTP session so blob downloads reuse pooled TCP/TLS connections
+_HTTP = requests.Session()
 
 # Use absolute paths based on project root
 DOCS_PATH = BASE_DIR / "data" / "docs.jsonl"
 VS_DIR = BASE_DIR / "vectorstore"
 INDEX_PATH = VS_DIR / "faiss_index.bin"
-META_PATH = VS_DIR / "metadata.pkl"
+META_PATH = VS_DIR / "metadata.msgpack"
+EMBEDDINGS_PATH = VS_DIR / "embeddings.npy"
+CHUNKS_PATH = VS_DIR / "chunks.bin"
+
+# Per-chunk metadata fields, stored column-wise in META_PATH
+METADATA_FIELDS = (
+    "doc_idx", "url", "title", "category", "heading",
+    "section_level", "chunk_id", "chunk_index", "word_count",
+)
+# Fields copied from each document, with the value used when a doc lacks one
+METADATA_DEFAULTS = {
+    "url": "", "title": "", "category": "", "heading": "",
+    "section_level": 0, "chunk_id": "", "chunk_index": 0, "word_count": 0,
+}
+
+# Build-time embeddings requests are packed up to EMBED_BATCH_SIZE inputs
+# (the API accepts up to 2048) and EMBED_BATCH_TOKENS tokens (the API caps a
+# request at 300k), so small chunks share few round trips
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "2048"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "250000"))
+
+# Optional reduced embedding size (text-embedding-3-* only), e.g. 1024 instead
+# of 3072. Smaller vectors mean a smaller index and less memory per scan; the
+# same value must be used at build and query time. Unset = model default.
+EMBED_DIMENSIONS = int(os.getenv("EMBED_DIMENSIONS", "0")) or None
+_EMBED_KWARGS = {"dimensions": EMBED_DIMENSIONS} if EMBED_DIMENSIONS else {}
+
+# Upper bound on in-flight OpenAI requests from this process, and how many
+# times a rate-limited (429), 5xx or connection-failed request is retried
+LLM_MAX_ASYNC = int(os.getenv("LLM_MAX_ASYNC", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+_LLM_SEM = threading.BoundedSemaphore(LLM_MAX_ASYNC)
+_RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+# asyncio counterpart of _LLM_SEM, one per event loop (asyncio primitives
+# can't be shared across loops)
+_ASYNC_LLM_SEMS = weakref.WeakKeyDictionary()
+
+# ANN index settings. HNSW is used by default; corpora of at least
+# IVFPQ_MIN_VECTORS chunks switch to IVF-PQ, whose compressed codes keep the
+# index small enough to hold in memory.
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+IVFPQ_MIN_VECTORS = 100_000
+IVF_NPROBE = 16
+# Optional faiss.index_factory string overriding the choice above, e.g.
+# "Flat" for exact search or "HNSW32" for unquantized HNSW
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "")
+
+# OpenMP threads FAISS uses for index searches and training (batched queries
+# are split across them). Unset = leave OpenMP's own default / OMP_NUM_THREADS
+FAISS_THREADS = int(os.getenv("FAISS_THREADS", "0"))
+if FAISS_THREADS:
+    faiss.omp_set_num_threads(FAISS_THREADS)
+
+# Up to this many vectors, search is an exact NumPy matmul against the saved
+# embeddings (one BLAS call) instead of a FAISS index search. The scan reads
+# every float32 vector (5000 x 3072 dims is ~60 MB), so beyond a few thousand
+# the compressed index is faster and maps far less memory. 0 disables it.
+BRUTE_FORCE_MAX_VECTORS = int(os.getenv("BRUTE_FORCE_MAX_VECTORS", "5000"))
+
+# Okapi BM25 parameters for the reranker's keyword score
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Optional cross-encoder second stage (sentence-transformers model name, e.g.
+# "BAAI/bge-reranker-base"). Unset = hybrid scoring only; the model and its
+# dependency are only loaded when this is set.
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL")
+_CROSS_ENCODER = None
+
+# Set VECTORSTORE_WARM=1 (e.g. on serverless) to load the index and open the
+# OpenAI connection at import, so the first request doesn't pay for them
+VECTORSTORE_WARM = os.getenv("VECTORSTORE_WARM", "0") == "1"
+
+# Loaded (index, payload), kept until the files on disk change
+_INDEX_CACHE: Optional[Tuple[faiss.Index, Dict]] = None
+_INDEX_MTIMES: Optional[Tuple[float, float]] = None
+_INDEX_LOCK = threading.Lock()
+# Reads attempted while the files on disk are caught mid-rebuild
+LOAD_ATTEMPTS = 3
+
+# LRU of normalized query embeddings (query text -> float32 bytes)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+_QUERY_CACHE: "OrderedDict[str, bytes]" = OrderedDict()
+_QUERY_CACHE_LOCK = threading.Lock()
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying: Retry-After if sent, else exponential backoff."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = 2 ** attempt
+    return delay + random.random()
+
+
+def create_embeddings(texts: List[str]):
+    """
+    Call the embeddings endpoint with bounded concurrency and retries.
+    
+    At most LLM_MAX_ASYNC requests are in flight at once; rate-limited,
+    5xx and connection-failed requests are retried up to LLM_MAX_RETRIES
+    times, honouring Retry-After.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            with _LLM_SEM:
+                return client.embeddings.create(
+                    model=EMBED_MODEL,
+                    input=texts,
+                    encoding_format="base64",
+                    **_EMBED_KWARGS
+                )
+        except _RETRYABLE_ERRORS as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"⏳ OpenAI request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _async_client() -> AsyncOpenAI:
+    return embed_queue.loop_local(
+        _ASYNC_CLIENTS,
+        lambda: AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0),
+        close=lambda aclient: aclient.close()
+    )
+
+
+def _async_llm_sem() -> asyncio.Semaphore:
+    return embed_queue.loop_local(_ASYNC_LLM_SEMS, lambda: asyncio.Semaphore(LLM_MAX_ASYNC))
+
+
+async def create_embeddings_async(texts: List[str]):
+    """
+    Async counterpart of create_embeddings (same retries and Retry-After).
+    
+    At most LLM_MAX_ASYNC requests per event loop are in flight at once.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with _async_llm_sem():
+                return await _async_client().embeddings.create(
+                    model=EMBED_MODEL,
+                    input=texts,
+                    encoding_format="base64",
+                    **_EMBED_KWARGS
+                )
+        except _RETRYABLE_ERRORS as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"⏳ OpenAI request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def embedding_matrix(resp) -> np.ndarray:
+    """
+    Decode a base64-format embeddings response into an (n, d) float32 matrix.
+    
+    Each row is little-endian float32 bytes, so it decodes straight into the
+    matrix without building Python float lists.
+    """
+    rows = [base64.b64decode(e.embedding) for e in resp.data]
+    X = np.empty((len(rows), len(rows[0]) // 4), dtype=np.float32)
+    for i, row in enumerate(rows):
+        X[i] = np.frombuffer(row, dtype="<f4")
+    return X
+
+
+async def embed_batches(batches: List[List[str]]) -> np.ndarray:
+    """
+    Embed batches concurrently (create_embeddings_async bounds the requests
+    in flight to LLM_MAX_ASYNC).
+    
+    Returns the embeddings stacked in input order.
+    """
+    async def embed_batch(n: int, batch: List[str]) -> np.ndarray:
+        print(f"⏳ Embedding batch {n}/{len(batches)}")
+        try:
+            resp = await create_embeddings_async(batch)
+        except Exception as e:
+            print(f"❌ Error embedding batch {n}: {e}")
+            raise
+        return embedding_matrix(resp)
+    
+    # gather preserves argument order, so results line up with the chunks
+    results = await asyncio.gather(*(embed_batch(n, b) for n, b in enumerate(batches, 1)))
+    X = np.empty((sum(len(M) for M in results), results[0].shape[1]), dtype=np.float32)
+    start = 0
+    for M in results:
+        X[start:start + len(M)] = M
+        start += len(M)
+    return X
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Token count per text for EMBED_MODEL (byte length if tiktoken is missing)."""
+    if tiktoken is None:
+        return [len(t.encode("utf-8")) for t in texts]
+    try:
+        enc = tiktoken.encoding_for_model(EMBED_MODEL)
+    except KeyError:
+        enc = tiktoken.get_encoding("cl100k_base")
+    return [len(tokens) for tokens in enc.encode_ordinary_batch(texts)]
+
+
+def pack_batches(texts: List[str]) -> List[List[str]]:
+    """
+    Greedily split texts, in order, into request batches of at most
+    EMBED_BATCH_SIZE inputs and EMBED_BATCH_TOKENS tokens.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for text, n_tokens in zip(texts, count_tokens(texts)):
+        if batch and (len(batch) == EMBED_BATCH_SIZE or batch_tokens + n_tokens > EMBED_BATCH_TOKENS):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += n_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed texts in token-packed batches, several requests in flight at once."""
+    return asyncio.run(embed_batches(pack_batches(texts)))
 
 
 def load_docs() -> List[Dict]:
     """Load pre-chunked documents from JSONL."""
-    docs = []
     docs_path = str(DOCS_PATH)
     if not os.path.exists(docs_path):
         raise FileNotFoundError(f"Documents file not found: {docs_path}")
-    with open(docs_path, encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                docs.append(json.loads(line))
-    return docs
+    with open(docs_path, "rb") as f:
+        data = f.read()
+    return [orjson.loads(line) for line in data.splitlines() if line.strip()]
 
 
 def build_faiss_index():
@@ -45,7 +294,9 @@ def build_faiss_index():
     
     # Extract content and metadata
     chunks = []
-    metadata = []
+    # Metadata is collected column-wise (one list per field), the layout it
+    # is stored and queried in
+    fields = {name: [] for name in METADATA_FIELDS}
     
     for idx, doc in enumerate(docs):
         content = doc.get("content", "")
@@ -53,50 +304,22 @@ def build_faiss_index():
             continue
         
         chunks.append(content)
-        metadata.append({
-            "doc_idx": idx,
-            "url": doc.get("url", ""),
-            "title": doc.get("title", ""),
-            "category": doc.get("category", ""),
-            "heading": doc.get("heading", ""),
-            "section_level": doc.get("section_level", 0),
-            "chunk_id": doc.get("chunk_id", ""),
-            "chunk_index": doc.get("chunk_index", 0),
-            "word_count": doc.get("word_count", 0),
-        })
+        fields["doc_idx"].append(idx)
+        for name, default in METADATA_DEFAULTS.items():
+            fields[name].append(doc.get(name, default))
     
     print(f"✅ Processing {len(chunks)} valid chunks")
     
-    # Generate embeddings in batches
-    BATCH_SIZE = 64
-    embeddings = []
-    
-    for i in range(0, len(chunks), BATCH_SIZE):
-        batch = chunks[i:i + BATCH_SIZE]
-        print(f"⏳ Embedding batch {i//BATCH_SIZE + 1}/{(len(chunks)-1)//BATCH_SIZE + 1}")
-        
-        try:
-            resp = client.embeddings.create(
-                model=EMBED_MODEL,
-                input=batch
-            )
-            batch_embeddings = [e.embedding for e in resp.data]
-            embeddings.extend(batch_embeddings)
-        except Exception as e:
-            print(f"❌ Error embedding batch {i//BATCH_SIZE + 1}: {e}")
-            raise
-    
-    # Convert to numpy array
-    X = np.array(embeddings, dtype="float32")
+    # Generate embeddings, reusing cached vectors for unchanged chunks
+    cache_model = f"{EMBED_MODEL}@{EMBED_DIMENSIONS}" if EMBED_DIMENSIONS else EMBED_MODEL
+    X = embed_cache.get_or_compute(chunks, cache_model, embed_texts)
     print(f"📊 Embedding matrix shape: {X.shape}")
     
     # Normalize for cosine similarity (using Inner Product)
     faiss.normalize_L2(X)
     
-    # Build FAISS index
-    dim = X.shape[1]
-    index = faiss.IndexFlatIP(dim)  # Inner Product = cosine similarity when normalized
-    index.add(X)
+    # Build FAISS index (Inner Product = cosine similarity when normalized)
+    index = create_index(X)
     
     print(f"✅ FAISS index created with {index.ntotal} vectors")
     
@@ -106,33 +329,123 @@ def build_faiss_index():
     index_path = str(INDEX_PATH)
     meta_path = str(META_PATH)
     
-    faiss.write_index(index, index_path)
+    # Every artifact is written to a temp file and renamed into place, so
+    # running workers that mmap the previous build keep valid mappings.
+    # Metadata goes last: its mtime (with the index's) triggers reloads.
+    
+    # Chunk texts go into one UTF-8 blob; metadata keeps the byte offsets
+    encoded = [c.encode("utf-8") for c in chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    write_replace(str(CHUNKS_PATH), lambda f: f.write(b"".join(encoded)))
     
-    with open(meta_path, "wb") as f:
-        pickle.dump({
-            "metadata": metadata,
-            "chunks": chunks
-        }, f)
+    # Keep the exact normalized vectors too: quantized/ANN indexes cannot give
+    # them back, and in-process consumers can mmap this instead of re-embedding
+    write_replace(str(EMBEDDINGS_PATH), lambda f: np.save(f, X))
+    
+    write_replace(index_path, lambda f: faiss.write_index(index, faiss.PyCallbackIOWriter(f.write)))
+    
+    token_sets = build_token_sets(fields)
+    meta = msgpack.packb({
+        "fields": fields,
+        "chunk_offsets": offsets.tobytes(),
+        **{key: [sorted(t) for t in sets] for key, sets in token_sets.items()},
+        **build_bm25(chunks),
+        "url_index": build_url_index(fields),
+    }, use_bin_type=True)
+    write_replace(meta_path, lambda f: f.write(meta))
+    
+    # Drop any previously loaded index so searches pick up the new build
+    global _INDEX_CACHE
+    _INDEX_CACHE = None
     
     print(f"💾 Index saved to {INDEX_PATH}")
     print(f"💾 Metadata saved to {META_PATH}")
+    print(f"💾 Chunks saved to {CHUNKS_PATH}")
+    print(f"💾 Embeddings saved to {EMBEDDINGS_PATH}")
     
     # Print statistics
-    print_index_stats(metadata)
+    print_index_stats(fields)
 
 
-def print_index_stats(metadata: List[Dict]):
-    """Print statistics about the indexed documents."""
-    categories = defaultdict(int)
-    urls = set()
+def write_replace(path: str, write: Callable[[BinaryIO], object]):
+    """
+    Write a build artifact to path via a temp file and os.replace.
     
-    for m in metadata:
-        categories[m["category"]] += 1
-        urls.add(m["url"])
+    The rename swaps the directory entry atomically: processes that still
+    have the old file open or memory-mapped keep the old, intact inode rather
+    than seeing it truncated and rewritten underneath them.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def normalize_rows(X: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize rows of a small float32 matrix in place.
+    
+    Used for query vectors: for a handful of rows a NumPy norm + divide is
+    cheaper than the faiss.normalize_L2 SWIG round trip. The index build
+    keeps faiss.normalize_L2 for the full matrix.
+    """
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    X /= np.maximum(norms, 1e-12)
+    return X
+
+
+def create_index(X: np.ndarray) -> faiss.Index:
+    """
+    Build an approximate nearest-neighbour index over normalized vectors.
+    
+    HNSW gives roughly logarithmic query time and stores vectors as 8-bit
+    scalar-quantized codes (the quantizer trains on X to learn per-dimension
+    ranges). For very large corpora an IVF-PQ index is trained instead, so
+    queries only scan a few inverted lists of compact product-quantized codes.
+    Setting FAISS_INDEX_TYPE builds that index_factory description instead.
+    """
+    n, dim = X.shape
+    
+    if FAISS_INDEX_TYPE:
+        index = faiss.index_factory(dim, FAISS_INDEX_TYPE, faiss.METRIC_INNER_PRODUCT)
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        if not index.is_trained:
+            index.train(X)
+    elif n >= IVFPQ_MIN_VECTORS:
+        nlist = int(4 * np.sqrt(n))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, dim // 8, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(X)
+    else:
+        # 8-bit scalar-quantized storage: 4x fewer bytes per vector than float32
+        index = faiss.IndexHNSWSQ(
+            dim, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.train(X)
+    
+    index.add(X)
+    return index
+
+
+def search_params(index: faiss.Index, k: int) -> Optional[faiss.SearchParameters]:
+    """Per-query search parameters for ANN indexes (None for exact indexes)."""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=max(64, k * 4))
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=IVF_NPROBE)
+    return None
+
+
+def print_index_stats(fields: Dict[str, list]):
+    """Print statistics about the indexed documents."""
+    categories = Counter(fields["category"])
     
     print("\n📊 Index Statistics:")
-    print(f"   Total chunks: {len(metadata)}")
-    print(f"   Unique pages: {len(urls)}")
+    print(f"   Total chunks: {len(fields['url'])}")
+    print(f"   Unique pages: {len(set(fields['url']))}")
     print(f"\n📁 Chunks by category:")
     for cat, count in sorted(categories.items(), key=lambda x: -x[1]):
         print(f"      {cat}: {count}")
@@ -143,26 +456,233 @@ def download_from_blob(url: str, path: str):
     if not os.path.exists(path):
         print(f"Downloading {os.path.basename(path)} from blob storage...")
         try:
-            response = requests.get(url, timeout=60)
-            response.raise_for_status()
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            with open(path, 'wb') as f:
-                f.write(response.content)
+            with _HTTP.get(url, timeout=60, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Stream to disk in 1 MiB pieces instead of buffering the whole
+                # file; rename at the end so a failed download leaves no partial file
+                tmp_path = path + ".part"
+                with open(tmp_path, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, length=1 << 20)
+                os.replace(tmp_path, path)
             print(f"✅ Downloaded {os.path.basename(path)}")
         except Exception as e:
             print(f"❌ Error downloading from blob: {e}")
             raise
 
 
+def build_token_sets(fields: Dict[str, list]) -> Dict[str, List[frozenset]]:
+    """Lowercased heading/title word sets per chunk, used for rerank boosts."""
+    return {
+        "heading_tokens": [frozenset(h.lower().split()) for h in fields["heading"]],
+        "title_tokens": [frozenset(t.lower().split()) for t in fields["title"]],
+    }
+
+
+def build_bm25(chunks: List[str]) -> Dict:
+    """
+    Term statistics for Okapi BM25 keyword scoring over chunk content.
+    
+    Term frequencies form a CSR matrix (row = chunk, column = term id from
+    "vocab"): int32 "indptr"/"indices" and float32 "tf", stored as raw bytes
+    alongside per-term IDF and per-chunk lengths, so loading is a handful of
+    np.frombuffer calls instead of one dict per chunk.
+    """
+    vocab = {}
+    indptr = np.zeros(len(chunks) + 1, dtype=np.int32)
+    doc_len = np.zeros(len(chunks), dtype=np.float32)
+    indices, term_freqs = [], []
+    for i, chunk in enumerate(chunks):
+        tf = Counter(chunk.lower().split())
+        indices.extend(vocab.setdefault(term, len(vocab)) for term in tf)
+        term_freqs.extend(tf.values())
+        indptr[i + 1] = len(indices)
+        doc_len[i] = sum(tf.values())
+    
+    indices = np.array(indices, dtype=np.int32)
+    n = len(chunks)
+    df = np.bincount(indices, minlength=len(vocab))
+    idf = np.log((n - df + 0.5) / (df + 0.5) + 1).astype(np.float32)
+    return {
+        "bm25": {
+            "vocab": vocab,
+            "idf": idf.tobytes(),
+            "indptr": indptr.tobytes(),
+            "indices": indices.tobytes(),
+            "tf": np.array(term_freqs, dtype=np.float32).tobytes(),
+            "doc_len": doc_len.tobytes(),
+            "avgdl": float(doc_len.sum()) / max(n, 1),
+        },
+    }
+
+
+# dtypes of the BM25 arrays stored as raw bytes in META_PATH
+_BM25_ARRAYS = {
+    "idf": np.float32, "indptr": np.int32, "indices": np.int32,
+    "tf": np.float32, "doc_len": np.float32,
+}
+
+
+def bm25_scores(query_terms: set, cand_idx: np.ndarray, payload: Dict) -> np.ndarray:
+    """BM25 score of each candidate chunk (by FAISS id) for the query terms."""
+    bm25 = payload["bm25"]
+    vocab = bm25["vocab"]
+    scores = np.zeros(len(cand_idx), dtype=np.float32)
+    q_ids = np.array([vocab[t] for t in query_terms if t in vocab], dtype=np.int32)
+    if not len(q_ids):
+        return scores
+    
+    # Gather every (row, term) entry of the candidate rows, keep the query terms
+    starts = bm25["indptr"][cand_idx]
+    lens = bm25["indptr"][cand_idx + 1] - starts
+    rows = np.repeat(np.arange(len(cand_idx)), lens)
+    pos = np.arange(lens.sum()) + np.repeat(starts - (np.cumsum(lens) - lens), lens)
+    is_query_term = np.zeros(len(vocab), dtype=bool)
+    is_query_term[q_ids] = True
+    terms = bm25["indices"][pos]
+    hit = is_query_term[terms]
+    rows, pos, terms = rows[hit], pos[hit], terms[hit]
+    
+    tf = bm25["tf"][pos]
+    dl = bm25["doc_len"][cand_idx]
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / bm25["avgdl"])
+    contrib = bm25["idf"][terms] * tf * (BM25_K1 + 1) / (tf + norm[rows])
+    scores += np.bincount(rows, weights=contrib, minlength=len(cand_idx)).astype(np.float32)
+    return scores
+
+
+class ChunkStore:
+    """
+    Chunk texts stored as one UTF-8 blob plus an offset table.
+    
+    The blob is memory-mapped, so loading costs only the offsets array and
+    ``store[i]`` decodes just chunk i from the page cache.
+    """
+    
+    def __init__(self, path: str, offsets: np.ndarray):
+        self.offsets = offsets
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, idx: int) -> str:
+        return self._mm[self.offsets[idx]:self.offsets[idx + 1]].decode("utf-8")
+
+
+class MetadataTable:
+    """
+    Column-oriented chunk metadata with list-of-dicts style access.
+    
+    Loading keeps one list per field instead of one dict per chunk;
+    ``table[i]`` builds the familiar metadata dict on demand.
+    """
+    
+    def __init__(self, fields: Dict[str, list]):
+        self.fields = fields
+    
+    def __len__(self) -> int:
+        return len(self.fields["url"])
+    
+    def __getitem__(self, idx: int) -> Dict:
+        return {name: column[idx] for name, column in self.fields.items()}
+    
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def build_columns(fields: Dict[str, list]) -> Dict[str, np.ndarray]:
+    """
+    Hot metadata fields as parallel arrays indexed by FAISS id.
+    
+    Lets filters run as vectorized comparisons and lookups skip per-chunk
+    dict access.
+    """
+    return {
+        "url": np.array(fields["url"], dtype=object),
+        "category": np.array(fields["category"], dtype=object),
+        "section_level": np.array(fields["section_level"], dtype=np.uint8),
+        "chunk_index": np.array(fields["chunk_index"], dtype=np.int32),
+    }
+
+
+def build_url_index(fields: Dict[str, list]) -> Dict[str, List[List[int]]]:
+    """
+    Map each URL to [chunk_indices, FAISS ids], both ordered by chunk_index.
+    
+    Built once at index time so context expansion is a dict lookup plus a
+    bisect on chunk_indices.
+    """
+    url_chunks = defaultdict(list)
+    for idx, (url, chunk_idx) in enumerate(zip(fields["url"], fields["chunk_index"])):
+        url_chunks[url].append((int(chunk_idx), idx))
+    return {
+        url: [list(pair) for pair in zip(*sorted(entries))]
+        for url, entries in url_chunks.items()
+    }
+
+
+def _index_mtimes(index_path: str, meta_path: str) -> Optional[Tuple[float, float]]:
+    try:
+        return os.path.getmtime(index_path), os.path.getmtime(meta_path)
+    except OSError:
+        return None
+
+
 def load_index() -> Tuple[faiss.Index, Dict]:
-    """Load FAISS index and metadata."""
+    """
+    Load FAISS index and metadata.
+    
+    The result is cached at module level, so only the first call per process
+    touches disk; later calls (every search) reuse the loaded objects until
+    either file's mtime changes (e.g. after a rebuild). Loading is guarded by
+    a lock so concurrent first requests only read the files once. If the
+    files on disk are caught mid-rebuild (from different builds), the
+    previously loaded build keeps being served until the next call.
+    """
+    global _INDEX_CACHE, _INDEX_MTIMES
+    
     # Convert Path objects to strings for file operations
     index_path = str(INDEX_PATH)
     meta_path = str(META_PATH)
+    chunks_path = str(CHUNKS_PATH)
+    
+    if _INDEX_CACHE is not None and _index_mtimes(index_path, meta_path) == _INDEX_MTIMES:
+        return _INDEX_CACHE
     
+    with _INDEX_LOCK:
+        # Another thread may have finished loading while this one waited
+        if _INDEX_CACHE is not None and _index_mtimes(index_path, meta_path) == _INDEX_MTIMES:
+            return _INDEX_CACHE
+        
+        for attempt in range(LOAD_ATTEMPTS):
+            _fetch_index_files(index_path, meta_path, chunks_path)
+            # Stat before reading: a rebuild landing mid-read then changes the
+            # mtimes again, so the next call reloads instead of keeping stale data
+            mtimes = _index_mtimes(index_path, meta_path)
+            try:
+                loaded = _read_index(index_path, meta_path, chunks_path)
+            except MixedBuildError:
+                if _INDEX_CACHE is not None:
+                    return _INDEX_CACHE
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.5)
+                continue
+            
+            _INDEX_CACHE, _INDEX_MTIMES = loaded, mtimes
+            return _INDEX_CACHE
+
+
+def _fetch_index_files(index_path: str, meta_path: str, chunks_path: str):
+    """Make sure the index artifacts are on disk, downloading them if configured."""
     # Download from Vercel Blob if URLs are provided and files don't exist
     blob_faiss_url = os.getenv("VERCEL_BLOB_FAISS_URL")
     blob_meta_url = os.getenv("VERCEL_BLOB_META_URL")
+    blob_chunks_url = os.getenv("VERCEL_BLOB_CHUNKS_URL")
     
     if blob_faiss_url and not os.path.exists(index_path):
         download_from_blob(blob_faiss_url, index_path)
@@ -170,28 +690,193 @@ def load_index() -> Tuple[faiss.Index, Dict]:
     if blob_meta_url and not os.path.exists(meta_path):
         download_from_blob(blob_meta_url, meta_path)
     
+    if blob_chunks_url and not os.path.exists(chunks_path):
+        download_from_blob(blob_chunks_url, chunks_path)
+    
     # Check if files exist after potential download
-    if not os.path.exists(index_path) or not os.path.exists(meta_path):
+    if not all(os.path.exists(p) for p in (index_path, meta_path, chunks_path)):
         raise FileNotFoundError(
             f"Index not found. Run build_faiss_index() first.\n"
-            f"Expected files:\n  - {index_path}\n  - {meta_path}\n"
+            f"Expected files:\n  - {index_path}\n  - {meta_path}\n  - {chunks_path}\n"
             f"Current working directory: {os.getcwd()}\n"
             f"BASE_DIR: {BASE_DIR}\n"
-            f"Or set VERCEL_BLOB_FAISS_URL and VERCEL_BLOB_META_URL environment variables."
+            f"Or set VERCEL_BLOB_FAISS_URL, VERCEL_BLOB_META_URL and "
+            f"VERCEL_BLOB_CHUNKS_URL environment variables."
         )
+
+
+class MixedBuildError(RuntimeError):
+    """The index artifacts on disk come from different builds (rebuild in progress)."""
+
+
+def _read_index(index_path: str, meta_path: str, chunks_path: str) -> Tuple[faiss.Index, Dict]:
+    """
+    Read the index artifacts from disk.
     
-    index = faiss.read_index(index_path)
+    The embeddings matrix is loaded here too (as payload["embeddings"]), so
+    it is cached and reloaded together with the index it belongs to.
+    """
+    # Memory-map where the index type supports it so pages are served from
+    # the OS page cache (and shared across worker processes) instead of copied
+    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
     with open(meta_path, "rb") as f:
-        payload = pickle.load(f)
+        payload = msgpack.unpackb(f.read(), raw=False)
+    fields = payload.pop("fields")
+    offsets = np.frombuffer(payload.pop("chunk_offsets"), dtype=np.int64)
+    if len(offsets) - 1 != index.ntotal or offsets[-1] != os.path.getsize(chunks_path):
+        raise MixedBuildError(f"{chunks_path} does not match {meta_path}")
+    payload["chunks"] = ChunkStore(chunks_path, offsets)
+    payload["embeddings"] = _read_embeddings(index)
+    payload["metadata"] = MetadataTable(fields)
+    payload["columns"] = build_columns(fields)
+    for key in ("heading_tokens", "title_tokens"):
+        payload[key] = [frozenset(t) for t in payload[key]]
+    bm25 = payload["bm25"]
+    for key, dtype in _BM25_ARRAYS.items():
+        bm25[key] = np.frombuffer(bm25[key], dtype=dtype)
     
     return index, payload
 
 
+def uses_brute_force(index: faiss.Index) -> bool:
+    """
+    Whether searches on index use the exact NumPy path: the corpus is small
+    and its embeddings are saved locally or downloadable from blob storage.
+    """
+    return index.ntotal <= BRUTE_FORCE_MAX_VECTORS and (
+        os.path.exists(str(EMBEDDINGS_PATH)) or bool(os.getenv("VERCEL_BLOB_EMBEDDINGS_URL"))
+    )
+
+
+def _read_embeddings(index: faiss.Index) -> Optional[np.ndarray]:
+    """
+    Memory-map EMBEDDINGS_PATH for brute-force search (None when not used),
+    downloading it from VERCEL_BLOB_EMBEDDINGS_URL first if it is missing.
+    """
+    if not uses_brute_force(index):
+        return None
+    
+    path = str(EMBEDDINGS_PATH)
+    blob_url = os.getenv("VERCEL_BLOB_EMBEDDINGS_URL")
+    if blob_url and not os.path.exists(path):
+        download_from_blob(blob_url, path)
+    X = np.load(path, mmap_mode="r")
+    if X.shape[0] != index.ntotal:
+        raise MixedBuildError(f"{path} has {X.shape[0]} rows, index has {index.ntotal}")
+    return X
+
+
+def load_embeddings() -> np.ndarray:
+    """
+    The (N, d) matrix of L2-normalized chunk embeddings, row i = FAISS id i.
+    
+    Memory-mapped read-only from EMBEDDINGS_PATH and cached with the index by
+    load_index(), so callers (e.g. an in-process reranker) can reuse the
+    vectors without re-embedding or re-normalizing them.
+    """
+    index, payload = load_index()
+    if payload["embeddings"] is None:
+        return np.load(str(EMBEDDINGS_PATH), mmap_mode="r")
+    return payload["embeddings"]
+
+
+def _cached_queries(queries: List[str]) -> Dict[str, bytes]:
+    """Query -> cached embedding bytes for the queries already in the LRU."""
+    cached = {}
+    with _QUERY_CACHE_LOCK:
+        for q in queries:
+            if q in _QUERY_CACHE:
+                _QUERY_CACHE.move_to_end(q)
+                cached[q] = _QUERY_CACHE[q]
+    return cached
+
+
+def _cache_queries(queries: List[str], M: np.ndarray, cached: Dict[str, bytes]):
+    """Add normalized rows M for queries to the LRU (and to cached)."""
+    with _QUERY_CACHE_LOCK:
+        for q, row in zip(queries, M):
+            cached[q] = _QUERY_CACHE[q] = row.tobytes()
+        while len(_QUERY_CACHE) > QUERY_CACHE_SIZE:
+            _QUERY_CACHE.popitem(last=False)
+
+
+def _stack_cached(queries: List[str], cached: Dict[str, bytes]) -> np.ndarray:
+    # np.stack copies, so callers get a writable array, not views of the cache
+    return np.stack([np.frombuffer(cached[q], dtype=np.float32) for q in queries])
+
+
+def embed_queries(queries: List[str]) -> np.ndarray:
+    """
+    Normalized (len(queries), d) float32 embeddings, served from an LRU cache.
+    
+    Repeated queries skip the API entirely; all cache misses are embedded
+    together in one request and added to the cache.
+    """
+    cached = _cached_queries(queries)
+    misses = [q for q in dict.fromkeys(queries) if q not in cached]
+    if misses:
+        resp = create_embeddings(misses)
+        M = normalize_rows(embedding_matrix(resp))
+        _cache_queries(misses, M, cached)
+    
+    return _stack_cached(queries, cached)
+
+
+async def _embed_query_batch(texts: List[str]) -> np.ndarray:
+    resp = await create_embeddings_async(texts)
+    return normalize_rows(embedding_matrix(resp))
+
+
+# Shared by all async searches in this process: queries arriving within a few
+# milliseconds of each other go out as one embeddings request
+_EMBED_QUEUE = embed_queue.BatchQueue(_embed_query_batch)
+
+
+async def embed_queries_async(queries: List[str]) -> np.ndarray:
+    """
+    Async embed_queries: cache misses go through the shared micro-batch queue,
+    so concurrent requests coalesce into a single embeddings call.
+    """
+    cached = _cached_queries(queries)
+    misses = [q for q in dict.fromkeys(queries) if q not in cached]
+    if misses:
+        rows = await asyncio.gather(*(_EMBED_QUEUE.submit(q) for q in misses))
+        _cache_queries(misses, np.stack(rows), cached)
+    
+    return _stack_cached(queries, cached)
+
+
+def search_vectors(
+    index: faiss.Index,
+    Q: np.ndarray,
+    k: int,
+    X: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k inner-product search for normalized query rows.
+    
+    Small corpora skip FAISS: ``X @ Q.T`` against the memory-mapped
+    embeddings (payload["embeddings"], which load_index() sets when
+    uses_brute_force() holds) is a single BLAS call and exact. Otherwise the
+    ANN index is searched. Returns FAISS-style (scores, ids).
+    """
+    if X is not None:
+        S = Q @ X.T
+        top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(S, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+    
+    return index.search(Q, k, params=search_params(index, k))
+
+
 def search_similar(
     query: str,
     k: int = 10,
     category_filter: Optional[str] = None,
-    rerank: bool = True
+    rerank: bool = True,
+    loaded: Optional[Tuple[faiss.Index, Dict]] = None,
+    dedup_by_url: bool = False
 ) -> List[Dict]:
     """
     Search for similar chunks with optional filtering and reranking.
@@ -201,95 +886,242 @@ def search_similar(
         k: Number of results to return (after reranking if enabled)
         category_filter: Optional category to filter by
         rerank: Whether to rerank results using cross-encoder scoring
+        loaded: Optional (index, payload) from load_index() to search against
+        dedup_by_url: Return at most one (the best) chunk per URL
     
     Returns:
         List of result dictionaries with content, metadata, and scores
     """
-    index, payload = load_index()
-    metadata = payload["metadata"]
-    chunks = payload["chunks"]
+    return search_similar_batch(
+        [query], k=k, category_filter=category_filter, rerank=rerank,
+        loaded=loaded, dedup_by_url=dedup_by_url
+    )[0]
+
+
+def search_similar_batch(
+    queries: List[str],
+    k: int = 10,
+    category_filter: Optional[str] = None,
+    rerank: bool = True,
+    loaded: Optional[Tuple[faiss.Index, Dict]] = None,
+    dedup_by_url: bool = False
+) -> List[List[Dict]]:
+    """
+    Search for several queries at once (e.g. expanded query variants).
     
-    # Embed query
-    resp = client.embeddings.create(model=EMBED_MODEL, input=[query])
-    qvec = np.array(resp.data[0].embedding, dtype="float32").reshape(1, -1)
-    faiss.normalize_L2(qvec)
+    All queries are embedded in a single API request and searched with one
+    FAISS call, instead of one round trip per query.
     
+    Returns:
+        One result list per query, in the same order as ``queries``
+    """
+    if not queries:
+        return []
+    
+    loaded = loaded or load_index()
+    
+    # Embed all queries (uncached ones in a single request)
+    Q = embed_queries(queries)
+    
+    return search_embedded(
+        queries, Q, loaded, k=k, category_filter=category_filter,
+        rerank=rerank, dedup_by_url=dedup_by_url
+    )
+
+
+def search_embedded(
+    queries: List[str],
+    Q: np.ndarray,
+    loaded: Tuple[faiss.Index, Dict],
+    k: int = 10,
+    category_filter: Optional[str] = None,
+    rerank: bool = True,
+    dedup_by_url: bool = False
+) -> List[List[Dict]]:
+    """Retrieval and reranking for queries whose normalized embeddings are Q."""
+    index, payload = loaded
+    scores, indices = search_vectors(
+        index, Q, search_depth(index, k, rerank, dedup_by_url), payload["embeddings"]
+    )
+    return rank_hits(
+        queries, scores, indices, payload, k=k, category_filter=category_filter,
+        rerank=rerank, dedup_by_url=dedup_by_url
+    )
+
+
+def search_depth(index: faiss.Index, k: int, rerank: bool, dedup_by_url: bool) -> int:
+    """How many candidates the vector search retrieves for a final top-k."""
     # Initial retrieval: get more candidates for reranking
     initial_k = k * 3 if rerank else k
-    scores, indices = index.search(qvec, min(initial_k, index.ntotal))
+    if dedup_by_url:
+        # Neighbouring chunks of one page crowd the top hits; retrieve deeper
+        # so k distinct URLs survive deduplication
+        initial_k = k * 10
+    return min(initial_k, index.ntotal)
+
+
+def rank_hits(
+    queries: List[str],
+    scores: np.ndarray,
+    indices: np.ndarray,
+    payload: Dict,
+    k: int = 10,
+    category_filter: Optional[str] = None,
+    rerank: bool = True,
+    dedup_by_url: bool = False
+) -> List[List[Dict]]:
+    """Turn per-query (scores, ids) rows into filtered, reranked result lists."""
+    metadata = payload["metadata"]
+    chunks = payload["chunks"]
+    categories = payload["columns"]["category"]
     
-    # Build initial results
-    results = []
-    for score, idx in zip(scores[0], indices[0]):
-        if idx == -1:  # FAISS returns -1 for missing results
-            continue
+    all_results = []
+    for query, row_scores, row_indices in zip(queries, scores, indices):
+        # Build initial results
+        results = []
+        for score, idx in zip(row_scores, row_indices):
+            if idx == -1:  # FAISS returns -1 for missing results
+                continue
+            
+            # Apply category filter
+            if category_filter and categories[idx] != category_filter:
+                continue
+            
+            results.append({
+                **metadata[idx],
+                "_idx": int(idx),
+                "vector_score": float(score),
+                "content": chunks[idx],
+            })
         
-        meta = metadata[idx]
-        chunk = chunks[idx]
+        # Rerank using simple relevance scoring, then the cross-encoder if enabled
+        if rerank and len(results) > 0:
+            if CROSS_ENCODER_MODEL:
+                results = rerank_results(query, results, payload)
+                if dedup_by_url:
+                    results = first_per_url(results, k * 3)
+                results = cross_encode_results(query, results, k)
+            else:
+                results = rerank_results(query, results, payload, k=None if dedup_by_url else k)
         
-        # Apply category filter
-        if category_filter and meta["category"] != category_filter:
-            continue
+        if dedup_by_url:
+            results = first_per_url(results, k)
         
-        results.append({
-            **meta,
-            "vector_score": float(score),
-            "content": chunk,
-        })
-    
-    # Rerank using simple relevance scoring
-    if rerank and len(results) > 0:
-        results = rerank_results(query, results)
+        # Keep top-k results
+        all_results.append(results[:k])
     
-    # Return top-k results
-    return results[:k]
+    return all_results
 
 
-def rerank_results(query: str, results: List[Dict]) -> List[Dict]:
+def first_per_url(results: List[Dict], limit: int) -> List[Dict]:
+    """The first result for each URL, in order, stopping after limit URLs."""
+    seen_urls = set()
+    unique = []
+    for result in results:
+        if result["url"] in seen_urls:
+            continue
+        seen_urls.add(result["url"])
+        unique.append(result)
+        if len(unique) == limit:
+            break
+    return unique
+
+
+def rerank_results(
+    query: str,
+    results: List[Dict],
+    payload: Optional[Dict] = None,
+    k: Optional[int] = None
+) -> List[Dict]:
     """
     Rerank results using hybrid scoring (vector + keyword + metadata).
     
-    This provides better relevance than vector search alone.
+    This provides better relevance than vector search alone. The keyword
+    score is BM25 over chunk content, scaled so the best candidate scores 1.
+    Term statistics and heading/title token sets are precomputed at index
+    build time (looked up via each result's "_idx"), so no chunk text is
+    re-tokenized per query.
+    
+    If ``k`` is given, only the top-k results are returned (selected with a
+    partial sort); otherwise all results are returned, best first.
     """
-    query_lower = query.lower()
-    query_words = set(query_lower.split())
+    if payload is None:
+        _, payload = load_index()
+    heading_tokens = payload["heading_tokens"]
+    title_tokens = payload["title_tokens"]
     
-    for result in results:
-        content_lower = result["content"].lower()
-        heading_lower = result["heading"].lower()
-        title_lower = result["title"].lower()
-        
-        # 1. Vector similarity score (already normalized 0-1)
-        vector_score = result["vector_score"]
-        
-        # 2. Keyword overlap score in content
-        content_words = set(content_lower.split())
-        keyword_score = len(query_words & content_words) / max(len(query_words), 1)
-        
-        # 3. Heading/title relevance boost
-        heading_boost = 0.0
-        if any(word in heading_lower for word in query_words):
-            heading_boost = 0.2
-        if any(word in title_lower for word in query_words):
-            heading_boost += 0.1
-        
-        # 4. Section level boost (prefer top-level sections)
-        level_boost = max(0, (4 - result["section_level"])) * 0.02
-        
-        # Combined score (weighted)
-        final_score = (
-            vector_score * 0.6 +          # 60% vector similarity
-            keyword_score * 0.25 +        # 25% keyword match
-            heading_boost +                # Up to 30% heading relevance
-            level_boost                    # Up to 6% for section importance
-        )
-        
-        result["rerank_score"] = final_score
-        result["keyword_score"] = keyword_score
+    query_words = set(query.lower().split())
     
-    # Sort by reranked score
-    results.sort(key=lambda x: x["rerank_score"], reverse=True)
-    return results
+    cand_idx = np.array([r["_idx"] for r in results], dtype=np.int64)
+    
+    # 1. Vector similarity score (already normalized 0-1)
+    vector_scores = np.fromiter(
+        (r["vector_score"] for r in results), dtype=np.float32, count=len(results)
+    )
+    
+    # 2. Keyword score in content: BM25, normalized 0-1 against the best candidate
+    bm25 = bm25_scores(query_words, cand_idx, payload)
+    best = bm25.max() if len(bm25) else 0.0
+    keyword_scores = bm25 / best if best > 0 else bm25
+    
+    # 3. Heading/title relevance boost
+    heading_boost = np.array(
+        [0.2 * (not query_words.isdisjoint(heading_tokens[i])) +
+         0.1 * (not query_words.isdisjoint(title_tokens[i])) for i in cand_idx],
+        dtype=np.float32,
+    )
+    
+    # 4. Section level boost (prefer top-level sections)
+    section_levels = payload["columns"]["section_level"][cand_idx].astype(np.float32)
+    level_boost = np.maximum(0, 4 - section_levels) * 0.02
+    
+    # Combined score (weighted)
+    final_scores = (
+        vector_scores * 0.6 +          # 60% vector similarity
+        keyword_scores * 0.25 +        # 25% keyword match
+        heading_boost +                # Up to 30% heading relevance
+        level_boost                    # Up to 6% for section importance
+    )
+    
+    for result, final_score, keyword_score in zip(results, final_scores, keyword_scores):
+        result["rerank_score"] = float(final_score)
+        result["keyword_score"] = float(keyword_score)
+    
+    # Sort by reranked score (stable, so ties keep retrieval order)
+    if k is not None and k < len(results):
+        top = np.sort(np.argpartition(-final_scores, k - 1)[:k])
+        order = top[np.argsort(-final_scores[top], kind="stable")]
+    else:
+        order = np.argsort(-final_scores, kind="stable")
+    return [results[i] for i in order]
+
+
+def get_cross_encoder():
+    """Load the CROSS_ENCODER_MODEL reranker once per process."""
+    global _CROSS_ENCODER
+    if _CROSS_ENCODER is None:
+        from sentence_transformers import CrossEncoder
+        _CROSS_ENCODER = CrossEncoder(CROSS_ENCODER_MODEL, max_length=512)
+    return _CROSS_ENCODER
+
+
+def cross_encode_results(query: str, results: List[Dict], k: int) -> List[Dict]:
+    """
+    Rescore hybrid-ranked candidates with a cross-encoder and keep the top k.
+    
+    The cross-encoder reads query and passage together, so it ranks more
+    precisely than the hybrid score; callers can then pass fewer chunks to
+    the LLM.
+    """
+    scores = get_cross_encoder().predict(
+        [(query, r["content"]) for r in results], batch_size=32
+    )
+    scores = np.asarray(scores, dtype=np.float32)
+    for result, score in zip(results, scores):
+        result["cross_encoder_score"] = float(score)
+    
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [results[i] for i in order]
 
 
 def search_with_context(
@@ -303,21 +1135,20 @@ def search_with_context(
     When a chunk is retrieved, also includes adjacent chunks from the same document
     to provide better context continuity.
     """
-    # Get initial results
-    results = search_similar(query, k=k, rerank=True)
+    # Get initial results, keeping the loaded payload for context expansion
+    loaded = load_index()
+    results = search_similar(query, k=k, rerank=True, loaded=loaded, dedup_by_url=True)
     
     if not expand_context or not results:
         return results
     
-    # Load full payload for context expansion
-    _, payload = load_index()
-    metadata = payload["metadata"]
+    return expand_results(results, loaded[1])
+
+
+def expand_results(results: List[Dict], payload: Dict) -> List[Dict]:
+    """Attach neighbouring chunks as content_with_context, one result per URL."""
     chunks = payload["chunks"]
-    
-    # Group chunks by URL and chunk_index
-    url_chunks = defaultdict(list)
-    for idx, meta in enumerate(metadata):
-        url_chunks[meta["url"]].append((meta.get("chunk_index", 0), idx, meta, chunks[idx]))
+    url_index = payload["url_index"]
     
     # Expand context for each result
     expanded_results = []
@@ -333,14 +1164,15 @@ def search_with_context(
         
         # Get adjacent chunks
         current_chunk_idx = result.get("chunk_index", 0)
-        url_chunk_list = sorted(url_chunks[url])
+        chunk_indices, ids = url_index.get(url, ([], []))
         
-        # Find current position
+        # Find current position, then include it and its immediate neighbors
         context_chunks = []
-        for chunk_idx, idx, meta, content in url_chunk_list:
-            # Include current chunk and immediate neighbors
-            if abs(chunk_idx - current_chunk_idx) <= 1:
-                context_chunks.append(content)
+        start = bisect.bisect_left(chunk_indices, current_chunk_idx - 1)
+        for pos in range(start, len(chunk_indices)):
+            if chunk_indices[pos] > current_chunk_idx + 1:
+                break
+            context_chunks.append(chunks[ids[pos]])
         
         # Combine context
         if len(context_chunks) > 1:
@@ -353,21 +1185,121 @@ def search_with_context(
     return expanded_results
 
 
+async def _search_vector_batch(
+    items: List[Tuple[Tuple[faiss.Index, Dict], np.ndarray, int]]
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Search (loaded index, query row, depth) items and split the hits per item.
+    
+    Items are grouped by the build their caller loaded (normally all the
+    same), so ids are always ranked against the matching metadata; each group
+    is one multi-query search in a worker thread.
+    """
+    groups = defaultdict(list)
+    for pos, ((index, _), _, _) in enumerate(items):
+        groups[id(index)].append(pos)
+    
+    results = [None] * len(items)
+    for positions in groups.values():
+        index, payload = items[positions[0]][0]
+        Q = np.stack([items[pos][1] for pos in positions])
+        depth = max(items[pos][2] for pos in positions)
+        scores, indices = await asyncio.to_thread(
+            search_vectors, index, Q, depth, payload["embeddings"]
+        )
+        for pos, row_scores, row_indices in zip(positions, scores, indices):
+            d = items[pos][2]
+            results[pos] = (row_scores[:d], row_indices[:d])
+    return results
+
+
+# Query vectors from concurrent async searches are searched together, so FAISS
+# (or the BLAS matmul) spreads one nq=B search across cores
+_SEARCH_QUEUE = embed_queue.BatchQueue(_search_vector_batch)
+
+
+async def _search_async(
+    query: str,
+    k: int,
+    category_filter: Optional[str] = None,
+    rerank: bool = True,
+    dedup_by_url: bool = False
+) -> Tuple[List[Dict], Dict]:
+    """Shared async path: batched embedding, batched search, threaded rerank."""
+    loaded = await asyncio.to_thread(load_index)
+    index, payload = loaded
+    Q = await embed_queries_async([query])
+    depth = search_depth(index, k, rerank, dedup_by_url)
+    scores, indices = await _SEARCH_QUEUE.submit((loaded, Q[0], depth))
+    results = await asyncio.to_thread(
+        rank_hits, [query], scores[None], indices[None], payload,
+        k=k, category_filter=category_filter, rerank=rerank, dedup_by_url=dedup_by_url
+    )
+    return results[0], payload
+
+
+async def search_similar_async(
+    query: str,
+    k: int = 10,
+    category_filter: Optional[str] = None,
+    rerank: bool = True
+) -> List[Dict]:
+    """
+    Async variant of search_similar for use from async request handlers.
+    
+    Concurrent calls share embeddings requests and index searches through
+    the micro-batch queues; index loading and reranking run in worker
+    threads so the event loop stays free.
+    """
+    results, _ = await _search_async(query, k, category_filter=category_filter, rerank=rerank)
+    return results
+
+
+async def search_with_context_async(
+    query: str,
+    k: int = 5,
+    expand_context: bool = True
+) -> List[Dict]:
+    """Async variant of search_with_context."""
+    results, payload = await _search_async(query, k, dedup_by_url=True)
+    
+    if not expand_context or not results:
+        return results
+    
+    return expand_results(results, payload)
+
+
 def search_by_category(category: str, limit: int = 20) -> List[Dict]:
     """Get all chunks from a specific category."""
     _, payload = load_index()
     metadata = payload["metadata"]
     chunks = payload["chunks"]
     
-    results = []
-    for idx, meta in enumerate(metadata):
-        if meta["category"] == category:
-            results.append({
-                **meta,
-                "content": chunks[idx]
-            })
+    matches = np.flatnonzero(payload["columns"]["category"] == category)[:limit]
+    return [{**metadata[idx], "content": chunks[idx]} for idx in matches]
+
+
+def warm_up():
+    """
+    Load the index and make one embeddings request to set up the HTTPS
+    connection pool. load_index() also fetches (downloading from blob storage
+    if needed) and maps the embeddings whenever uses_brute_force() holds.
     
-    return results[:limit]
+    Failures are reported and otherwise ignored; the first search retries.
+    """
+    try:
+        load_index()
+    except Exception as e:
+        print(f"⚠️  Index warm-up failed: {e}")
+    
+    try:
+        create_embeddings(["warmup"])
+    except Exception as e:
+        print(f"⚠️  Embeddings warm-up failed: {e}")
+
+
+if VECTORSTORE_WARM and __name__ != "__main__":
+    warm_up()
 
 
 if __name__ == "__main__":
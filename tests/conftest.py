@@ -0,0 +1,64 @@
+"""
+Shared fixtures: a stub app.config rooted in a temp dir, and a local
+OpenAI-compatible embeddings server the real SDK clients talk to.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+DIM = 8
+
+
+class _EmbeddingsHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so pooled connections are reused across requests
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        data = [
+            {"object": "embedding", "index": i, "embedding": base64.b64encode(fake_embedding(text)).decode()}
+            for i, text in enumerate(req["input"])
+        ]
+        body = json.dumps({
+            "object": "list", "data": data, "model": req["model"],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_embedding(text: str) -> bytes:
+    """Deterministic little-endian float32 vector for text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    return np.random.default_rng(seed).standard_normal(DIM).astype("<f4").tobytes()
+
+
+_server = ThreadingHTTPServer(("127.0.0.1", 0), _EmbeddingsHandler)
+_server.daemon_threads = True
+threading.Thread(target=_server.serve_forever, daemon=True).start()
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{_server.server_port}/v1"
+
+# app.config isn't committed (it reads local settings); stub the names used
+BASE_DIR = Path(tempfile.mkdtemp())
+config = types.ModuleType("app.config")
+config.OPENAI_API_KEY = "sk-test"
+config.EMBED_MODEL = "text-embedding-3-small"
+config.BASE_DIR = BASE_DIR
+sys.modules["app.config"] = config
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
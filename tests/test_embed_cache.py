@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from app import embed_cache
+
+
+def fake_embed(texts):
+    return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_failed_window_keeps_earlier_windows(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_cache, "CACHE_PATH", tmp_path / "cache.sqlite")
+    monkeypatch.setattr(embed_cache, "_EMBED_WINDOW", 2)
+    texts = [f"text {'x' * i}" for i in range(5)]
+    calls = []
+
+    def failing_embed(batch):
+        calls.append(batch)
+        if len(calls) == 2:
+            raise RuntimeError("rate limited")
+        return fake_embed(batch)
+
+    with pytest.raises(RuntimeError):
+        embed_cache.get_or_compute(texts, "m", failing_embed)
+
+    # The first window was committed; the rerun embeds only the rest
+    calls.clear()
+    X = embed_cache.get_or_compute(texts, "m", lambda batch: calls.append(batch) or fake_embed(batch))
+    assert calls == [texts[2:4], texts[4:]]
+    assert np.array_equal(X, fake_embed(texts))
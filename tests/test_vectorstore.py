@@ -0,0 +1,61 @@
+import asyncio
+import os
+import threading
+
+import numpy as np
+import orjson
+
+from app import vectorstore
+from conftest import fake_embedding
+
+
+def write_docs(contents):
+    os.makedirs(os.path.dirname(str(vectorstore.DOCS_PATH)), exist_ok=True)
+    with open(vectorstore.DOCS_PATH, "wb") as f:
+        for i, content in enumerate(contents):
+            f.write(orjson.dumps({"url": f"https://example.com/{i}", "content": content}) + b"\n")
+
+
+def test_build_twice():
+    # Each build embeds new chunks, so both run embed_texts (asyncio.run)
+    write_docs([f"first build chunk number {i} with some text" for i in range(5)])
+    vectorstore.build_faiss_index()
+    write_docs([f"second build chunk number {i} with some text" for i in range(5)])
+    vectorstore.build_faiss_index()
+
+    index, payload = vectorstore.load_index()
+    assert index.ntotal == 5
+    assert payload["chunks"][0].startswith("second build")
+
+
+def test_embed_queries_async_across_loops():
+    for run in range(3):
+        queries = [f"query {run} {i}" for i in range(4)]
+        Q = asyncio.run(vectorstore.embed_queries_async(queries))
+        assert Q.shape == (4, 8)
+    # Clients of finished loops are closed and released
+    assert len(vectorstore._ASYNC_CLIENTS) <= 1
+
+
+def test_embed_queries_async_from_threads():
+    # Each thread runs its own loops; batches must never mix them
+    errors = []
+
+    def worker(t):
+        try:
+            for run in range(5):
+                queries = [f"thread {t} run {run} query {i}" for i in range(3)]
+                Q = asyncio.run(asyncio.wait_for(vectorstore.embed_queries_async(queries), 10))
+                expected = vectorstore.normalize_rows(np.stack(
+                    [np.frombuffer(fake_embedding(q), dtype="<f4") for q in queries]
+                ))
+                assert np.allclose(Q, expected, atol=1e-5)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors